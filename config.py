@@ -18,7 +18,22 @@ TREE_STRUCTURE = {
     "intermediate_right": ["leaf_2", "leaf_3"],
 }
 
-BASE_URL = "http://localhost"
+BASE_URL = "http://127.0.0.1"  # Loopback address directly, avoiding a resolver lookup for "localhost"
+
+# Headers for pre-serialized JSON request bodies
+JSON_HEADERS = {"content-type": "application/json"}
+
+# Outbound request limits for parent agents
+MAX_CONCURRENT_REQUESTS = 64  # In-flight requests per agent before callers wait
+REQUEST_TIMEOUT = 20.0  # Seconds per child request (root allows one extra hop)
+
+# Intermediate result cache for repeated identical tasks
+RESULT_CACHE_TTL = 5.0  # Seconds a cached aggregation stays valid
+RESULT_CACHE_SIZE = 1024  # Max cached aggregations before evicting the oldest
+
+# Leaf task batching
+LEAF_BATCH_WINDOW = 0.005  # Seconds to collect a burst of tasks into one batch
+LEAF_BATCH_SIZE = 32  # Max tasks sharing one simulated work period
 
 
 def get_agent_url(agent_name: str) -> str:
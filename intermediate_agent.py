@@ -1,69 +1,146 @@
 """Intermediate agent (Level 2) - Forwards tasks to leaves and aggregates results."""
 
 import argparse
+import logging
 import httpx
+import orjson
 import asyncio
-from fastapi import FastAPI, HTTPException
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
-from models import Task, LeafResult, IntermediateResult, HealthResponse, UpdateChildrenRequest
-from config import PORTS, get_agent_url, TREE_STRUCTURE
+from models import IntermediateResult, HealthResponse, UpdateChildrenRequest
+from config import (
+    PORTS, JSON_HEADERS, MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT,
+    RESULT_CACHE_TTL, RESULT_CACHE_SIZE, get_agent_url, TREE_STRUCTURE
+)
+
+
+logger = logging.getLogger(__name__)
 
 
 class IntermediateAgent:
     def __init__(self, name: str, children: list[str]):
         self.name = name
         self.children = children
+        self.child_task_urls = self._build_task_urls(children)
         self.total_tokens_processed = 0
-
-    async def forward_task_to_child(self, child_name: str, task: Task) -> LeafResult:
-        """Forward a task to a child leaf agent."""
-        url = f"{get_agent_url(child_name)}/task"
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=task.model_dump())
-            response.raise_for_status()
-            return LeafResult(**response.json())
-
-    async def process_task(self, task: Task) -> IntermediateResult:
-        """Forward task to all children and aggregate results."""
-        if not self.children:
-            return IntermediateResult(
-                agent_name=self.name,
-                total_tokens=0,
-                leaf_results=[],
-                task_id=task.task_id
+        self.client = None  # Shared httpx.AsyncClient, set in the app lifespan
+        self.sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        # Cache key -> (monotonic time stored, aggregated result), oldest first
+        self.cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.cache_ttl = RESULT_CACHE_TTL
+
+    @staticmethod
+    def _build_task_urls(children: list[str]) -> dict[str, str]:
+        """Precompute the /task URL for each child."""
+        return {child: f"{get_agent_url(child)}/task" for child in children}
+
+    async def forward_task_to_child(self, child_name: str, task_bytes: bytes) -> dict:
+        """Forward raw task JSON to a child leaf agent and return its raw result."""
+        url = self.child_task_urls[child_name]
+        async with self.sem:
+            response = await asyncio.wait_for(
+                self.client.post(url, content=task_bytes, headers=JSON_HEADERS),
+                timeout=REQUEST_TIMEOUT
             )
+        response.raise_for_status()
+        return orjson.loads(response.content)
 
-        # Forward task to all children in parallel
-        tasks = [
-            self.forward_task_to_child(child, task)
-            for child in self.children
-        ]
-
-        leaf_results = await asyncio.gather(*tasks, return_exceptions=True)
+    async def _forward_safe(self, child_name: str, task_bytes: bytes) -> dict | None:
+        """Forward to a child, returning None on failure so sibling requests keep running."""
+        try:
+            return await self.forward_task_to_child(child_name, task_bytes)
+        except Exception as e:
+            logger.warning("Error from child '%s': %s", child_name, e)
+            return None
+
+    @staticmethod
+    def _cache_key(task: dict) -> str:
+        """Hash the parts of a task that determine its result (not the task_id)."""
+        key_bytes = orjson.dumps([task.get("description"), task.get("data") or {}], option=orjson.OPT_SORT_KEYS)
+        return blake2b(key_bytes, digest_size=16).hexdigest()
+
+    def _get_cached(self, key: str, task_id: str) -> dict | None:
+        """Return a cached aggregation re-tagged with task_id, or None if missing or expired."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > self.cache_ttl:
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return {
+            **result,
+            "leaf_results": [{**r, "task_id": task_id} for r in result["leaf_results"]],
+            "task_id": task_id,
+            "cached": True  # No leaf did work for this result
+        }
 
-        # Filter out errors and collect successful results
+    def _store_cached(self, key: str, result: dict):
+        """Cache an aggregation, evicting the oldest entries beyond RESULT_CACHE_SIZE."""
+        self.cache[key] = (time.monotonic(), result)
+        self.cache.move_to_end(key)
+        while len(self.cache) > RESULT_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+    async def process_task(self, task: dict, task_bytes: bytes) -> dict:
+        """Forward raw task JSON to all children and aggregate results into an IntermediateResult dict."""
+        task_id = task["task_id"]
+        children = self.children
+        if not children:
+            return {
+                "agent_name": self.name,
+                "total_tokens": 0,
+                "leaf_results": [],
+                "task_id": task_id
+            }
+
+        # Identical tasks seen within the TTL reuse the previous aggregation
+        key = self._cache_key(task)
+        cached = self._get_cached(key, task_id)
+        if cached is not None:
+            return cached
+
+        # Forward the task bytes as received to all children in parallel
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(self._forward_safe(child, task_bytes))
+                for child in children
+            ]
+
+        # Collect successful results, skipping failed children
         successful_results = []
-        for result in leaf_results:
-            if isinstance(result, LeafResult):
+        total_tokens = 0
+        for t in tasks:
+            result = t.result()
+            if result is not None:
                 successful_results.append(result)
-            elif isinstance(result, Exception):
-                print(f"Error from child: {result}")
+                total_tokens += result["tokens_processed"]
 
-        total_tokens = sum(r.tokens_processed for r in successful_results)
         self.total_tokens_processed += total_tokens
 
-        return IntermediateResult(
-            agent_name=self.name,
-            total_tokens=total_tokens,
-            leaf_results=successful_results,
-            task_id=task.task_id
-        )
+        result = {
+            "agent_name": self.name,
+            "total_tokens": total_tokens,
+            "leaf_results": successful_results,
+            "task_id": task_id
+        }
+        # Only cache complete aggregations for the children that are still current
+        if len(successful_results) == len(children) and children is self.children:
+            self._store_cached(key, result)
+        return result
 
     def update_children(self, new_children: list[str]):
         """Update the list of children."""
         self.children = new_children
-        print(f"Agent '{self.name}' updated children to: {self.children}")
+        self.child_task_urls = self._build_task_urls(new_children)
+        self.cache.clear()
+        logger.info("Agent '%s' updated children to: %s", self.name, self.children)
 
     def get_health(self) -> HealthResponse:
         """Return health status."""
@@ -82,20 +159,51 @@ def create_app(agent_name: str) -> FastAPI:
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        print(f"Intermediate agent '{agent_name}' starting with children: {agent.children}")
+        logger.info("Intermediate agent '%s' starting with children: %s", agent_name, agent.children)
+        # Agent traffic is plain HTTP on the local host: skip proxy env lookup and CA loading
+        agent.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                verify=False,
+                retries=0
+            ),
+            trust_env=False,
+            timeout=httpx.Timeout(30.0)
+        )
         yield
-        print(f"Intermediate agent '{agent_name}' shutting down...")
+        await agent.client.aclose()
+        logger.info("Intermediate agent '%s' shutting down...", agent_name)
 
     app = FastAPI(
         title=f"Intermediate Agent - {agent_name}",
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
     )
 
-    @app.post("/task", response_model=IntermediateResult)
-    async def handle_task(task: Task):
-        """Forward task to children and return aggregated results."""
+    # The task is relayed to leaves verbatim and child results are trusted
+    # internal payloads, so skip request parsing and response-model revalidation
+    @app.post("/task", response_model=None, responses={200: {"model": IntermediateResult}})
+    async def handle_task(request: Request):
+        """Forward task to children and return aggregated results (IntermediateResult shape)."""
+        task_bytes = await request.body()
         try:
-            return await agent.process_task(task)
+            task = orjson.loads(task_bytes)
+        except orjson.JSONDecodeError:
+            task = None
+        # Cheap structural check matching the Task model, without building one
+        if (
+            not isinstance(task, dict)
+            or not isinstance(task.get("task_id"), str)
+            or not isinstance(task.get("description"), str)
+            or not isinstance(task.get("data"), (dict, type(None)))
+        ):
+            raise HTTPException(
+                status_code=422,
+                detail="Request body must be a JSON task with string task_id and description and optional object data"
+            )
+
+        try:
+            return await agent.process_task(task, task_bytes)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -125,6 +233,10 @@ def create_app(agent_name: str) -> FastAPI:
 if __name__ == "__main__":
     import uvicorn
 
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    # httpx logs every request at INFO; keep it off the hot path
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
     parser = argparse.ArgumentParser(description="Run an intermediate agent")
     parser.add_argument("--name", required=True, help="Agent name (intermediate_left, intermediate_right)")
     args = parser.parse_args()
@@ -135,4 +247,4 @@ if __name__ == "__main__":
 
     port = PORTS[args.name]
     app = create_app(args.name)
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, loop="uvloop", http="httptools")
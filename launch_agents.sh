@@ -18,6 +18,12 @@ echo -e "${GREEN}========================================${NC}"
 echo -e "${GREEN}  Multi-Agent System Launcher${NC}"
 echo -e "${GREEN}========================================${NC}"
 
+# Check Python version (agents need asyncio.TaskGroup from 3.11)
+if ! python3 -c 'import sys; sys.exit(sys.version_info < (3, 11))'; then
+    echo -e "${RED}Python 3.11+ is required (found $(python3 --version 2>&1)).${NC}"
+    exit 1
+fi
+
 # Check if virtual environment exists
 if [ ! -d "venv" ]; then
     echo -e "${YELLOW}Creating virtual environment...${NC}"
@@ -1,12 +1,19 @@
 """Leaf agent (Level 3) - Processes tasks and returns token counts."""
 
 import argparse
+import logging
 import random
+import orjson
 import asyncio
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
 from models import Task, LeafResult, HealthResponse
+from config import PORTS, LEAF_BATCH_WINDOW, LEAF_BATCH_SIZE
+
+
+logger = logging.getLogger(__name__)
 
 
 class LeafAgent:
@@ -14,23 +21,74 @@ class LeafAgent:
         self.name = name
         self.tasks_processed = 0
         self.total_tokens = 0
-
-    async def process_task(self, task: Task) -> LeafResult:
-        """Simulate work by processing a task and returning tokens processed."""
+        self._rng = random.Random()  # Per-agent generator instead of the shared module state
+        self._pending: list[tuple[Task, asyncio.Future]] = []
+        self._pending_event = asyncio.Event()
+        self._running_batches: set[asyncio.Task] = set()
+
+    async def process_task(self, task: Task) -> dict:
+        """Queue a task for the batcher and return its LeafResult dict once processed."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((task, future))
+        self._pending_event.set()
+        return await future
+
+    async def run_batcher(self):
+        """Group pending tasks into batches that share one simulated work period."""
+        while True:
+            await self._pending_event.wait()
+            # Let a burst of tasks accumulate before cutting a batch
+            await asyncio.sleep(LEAF_BATCH_WINDOW)
+
+            batch = self._pending[:LEAF_BATCH_SIZE]
+            del self._pending[:LEAF_BATCH_SIZE]
+            if not self._pending:
+                self._pending_event.clear()
+
+            # Batches run concurrently so a slow one does not hold up the next
+            batch_task = asyncio.create_task(self._process_batch(batch))
+            self._running_batches.add(batch_task)
+            batch_task.add_done_callback(self._running_batches.discard)
+
+    async def _process_batch(self, batch: list[tuple[Task, asyncio.Future]]):
+        """Simulate work once for a batch and resolve each task's future."""
         # Simulate processing time
-        await asyncio.sleep(random.uniform(0.1, 0.5))
-
-        # Generate random tokens processed (simulating work)
-        tokens = random.randint(100, 1000)
-
-        self.tasks_processed += 1
-        self.total_tokens += tokens
-
-        return LeafResult(
-            agent_name=self.name,
-            tokens_processed=tokens,
-            task_id=task.task_id
-        )
+        try:
+            await asyncio.sleep(self._rng.uniform(0.1, 0.5))
+        except asyncio.CancelledError:
+            # Shutting down: release every caller waiting on this batch
+            for _, future in batch:
+                future.cancel()
+            raise
+
+        for task, future in batch:
+            # The caller may have gone away while the batch was sleeping
+            if future.done():
+                continue
+
+            # Generate random tokens processed (simulating work)
+            tokens = self._rng.randint(100, 1000)
+
+            self.tasks_processed += 1
+            self.total_tokens += tokens
+
+            future.set_result({
+                "agent_name": self.name,
+                "tokens_processed": tokens,
+                "task_id": task.task_id
+            })
+
+    async def stop_batcher(self, batcher: asyncio.Task):
+        """Stop the batcher and in-flight batches, cancelling every unresolved task."""
+        batcher.cancel()
+        running = list(self._running_batches)
+        for batch_task in running:
+            batch_task.cancel()
+        await asyncio.gather(batcher, *running, return_exceptions=True)
+
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
 
     def get_health(self) -> HealthResponse:
         """Return health status."""
@@ -48,19 +106,31 @@ def create_app(agent_name: str) -> FastAPI:
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        print(f"Leaf agent '{agent_name}' starting...")
+        logger.info("Leaf agent '%s' starting...", agent_name)
+        batcher = asyncio.create_task(agent.run_batcher())
         yield
-        print(f"Leaf agent '{agent_name}' shutting down...")
+        await agent.stop_batcher(batcher)
+        logger.info("Leaf agent '%s' shutting down...", agent_name)
 
     app = FastAPI(
         title=f"Leaf Agent - {agent_name}",
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
     )
 
-    @app.post("/task", response_model=LeafResult)
+    # Precomputed JSON prefix of every LeafResult this agent returns
+    result_prefix = b'{"agent_name":' + orjson.dumps(agent_name) + b',"tokens_processed":'
+
+    # The result shape is fixed, so fill in the template instead of validating and encoding a model
+    @app.post("/task", response_model=None, responses={200: {"model": LeafResult}})
     async def handle_task(task: Task):
-        """Process a task and return the result."""
-        return await agent.process_task(task)
+        """Process a task and return the result (LeafResult shape)."""
+        result = await agent.process_task(task)
+        return Response(
+            content=result_prefix + str(result["tokens_processed"]).encode()
+            + b',"task_id":' + orjson.dumps(task.task_id) + b'}',
+            media_type="application/json"
+        )
 
     @app.get("/health", response_model=HealthResponse)
     async def health_check():
@@ -81,7 +151,10 @@ def create_app(agent_name: str) -> FastAPI:
 
 if __name__ == "__main__":
     import uvicorn
-    from config import PORTS
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    # httpx logs every request at INFO; keep it off the hot path
+    logging.getLogger("httpx").setLevel(logging.WARNING)
 
     parser = argparse.ArgumentParser(description="Run a leaf agent")
     parser.add_argument("--name", required=True, help="Agent name (leaf_0, leaf_1, leaf_2, leaf_3)")
@@ -93,4 +166,4 @@ if __name__ == "__main__":
 
     port = PORTS[args.name]
     app = create_app(args.name)
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, loop="uvloop", http="httptools")
@@ -1,11 +1,16 @@
 """Shared data models for the multi-agent system."""
 
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+
+# Shared by all agent DTOs: immutable once built (unknown fields are ignored by default)
+MODEL_CONFIG = ConfigDict(frozen=True)
 
 
 class Task(BaseModel):
     """Task to be processed by agents."""
+    model_config = MODEL_CONFIG
+
     task_id: str
     description: str
     data: Optional[dict] = None
@@ -13,6 +18,8 @@ class Task(BaseModel):
 
 class LeafResult(BaseModel):
     """Result from a leaf agent."""
+    model_config = MODEL_CONFIG
+
     agent_name: str
     tokens_processed: int
     task_id: str
@@ -20,14 +27,19 @@ class LeafResult(BaseModel):
 
 class IntermediateResult(BaseModel):
     """Aggregated result from an intermediate agent."""
+    model_config = MODEL_CONFIG
+
     agent_name: str
     total_tokens: int
     leaf_results: list[LeafResult]
     task_id: str
+    cached: bool = False  # True when served from the intermediate's result cache
 
 
 class RootResult(BaseModel):
     """Final aggregated result from root agent."""
+    model_config = MODEL_CONFIG
+
     task_id: str
     total_tokens: int
     intermediate_results: list[IntermediateResult]
@@ -35,6 +47,8 @@ class RootResult(BaseModel):
 
 class HealthResponse(BaseModel):
     """Health check response."""
+    model_config = MODEL_CONFIG
+
     status: str
     agent_name: str
     agent_type: str
@@ -43,4 +57,6 @@ class HealthResponse(BaseModel):
 
 class UpdateChildrenRequest(BaseModel):
     """Request to update an agent's children."""
+    model_config = MODEL_CONFIG
+
     new_children: list[str]
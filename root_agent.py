@@ -1,81 +1,121 @@
 """Root agent (Level 1) - Receives tasks, distributes to intermediates, aggregates results."""
 
 import httpx
+import logging
+import orjson
 import asyncio
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 
-from models import Task, IntermediateResult, RootResult, HealthResponse, UpdateChildrenRequest
-from config import PORTS, get_agent_url, TREE_STRUCTURE
+from models import Task, RootResult, HealthResponse, UpdateChildrenRequest
+from config import PORTS, JSON_HEADERS, MAX_CONCURRENT_REQUESTS, REQUEST_TIMEOUT, get_agent_url, TREE_STRUCTURE
+
+
+logger = logging.getLogger(__name__)
 
 
 class RootAgent:
+    __slots__ = (
+        "name", "children", "task_urls", "update_children_urls", "intermediate_children",
+        "left_tokens", "right_tokens", "load_balance_threshold", "total_tasks", "client", "sem",
+    )
+
     def __init__(self):
         self.name = "root"
         self.children = TREE_STRUCTURE["root"].copy()
+        self.task_urls = {child: f"{get_agent_url(child)}/task" for child in self.children}
+        self.update_children_urls = {
+            child: f"{get_agent_url(child)}/update_children" for child in self.children
+        }
         self.intermediate_children = {
             "intermediate_left": TREE_STRUCTURE["intermediate_left"].copy(),
             "intermediate_right": TREE_STRUCTURE["intermediate_right"].copy(),
         }
-        self.tokens_by_intermediate = {
-            "intermediate_left": 0,
-            "intermediate_right": 0,
-        }
+        # Tokens processed per intermediate since the last rebalance
+        self.left_tokens = 0
+        self.right_tokens = 0
         self.load_balance_threshold = 0.3  # 30% difference triggers rebalancing
         self.total_tasks = 0
+        self.client = None  # Shared httpx.AsyncClient, set in the app lifespan
+        self.sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
-    async def forward_task_to_intermediate(self, intermediate_name: str, task: Task) -> IntermediateResult:
-        """Forward a task to an intermediate agent."""
-        url = f"{get_agent_url(intermediate_name)}/task"
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, json=task.model_dump())
-            response.raise_for_status()
-            return IntermediateResult(**response.json())
+    @property
+    def tokens_by_intermediate(self) -> dict[str, int]:
+        """Tokens processed per intermediate, keyed by intermediate name."""
+        return {
+            "intermediate_left": self.left_tokens,
+            "intermediate_right": self.right_tokens,
+        }
 
-    async def process_task(self, task: Task) -> RootResult:
-        """Distribute task to intermediates and aggregate results."""
-        self.total_tasks += 1
+    async def forward_task_to_intermediate(self, intermediate_name: str, task_bytes: bytes) -> dict:
+        """Forward serialized task JSON to an intermediate agent and return its raw result."""
+        url = self.task_urls[intermediate_name]
+        async with self.sem:
+            # Intermediates wait up to REQUEST_TIMEOUT on their own leaves
+            response = await asyncio.wait_for(
+                self.client.post(url, content=task_bytes, headers=JSON_HEADERS),
+                timeout=2 * REQUEST_TIMEOUT
+            )
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    async def _forward_safe(self, intermediate_name: str, task_bytes: bytes) -> dict | None:
+        """Forward to an intermediate, returning None on failure so sibling requests keep running."""
+        try:
+            return await self.forward_task_to_intermediate(intermediate_name, task_bytes)
+        except Exception as e:
+            logger.warning("Error from intermediate '%s': %s", intermediate_name, e)
+            return None
 
-        # Forward to both intermediates in parallel
-        tasks = [
-            self.forward_task_to_intermediate(child, task)
-            for child in self.children
-        ]
+    async def process_task(self, task: Task, task_bytes: bytes) -> dict:
+        """Distribute serialized task JSON to intermediates and aggregate results into a RootResult dict."""
+        self.total_tasks += 1
 
-        intermediate_results = await asyncio.gather(*tasks, return_exceptions=True)
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(self._forward_safe(child, task_bytes))
+                for child in self.children
+            ]
 
-        # Process results and track tokens
+        # Collect successful results and track tokens
         successful_results = []
-        for i, result in enumerate(intermediate_results):
-            if isinstance(result, IntermediateResult):
-                successful_results.append(result)
-                self.tokens_by_intermediate[result.agent_name] += result.total_tokens
-            elif isinstance(result, Exception):
-                print(f"Error from intermediate '{self.children[i]}': {result}")
-
-        total_tokens = sum(r.total_tokens for r in successful_results)
-
-        return RootResult(
-            task_id=task.task_id,
-            total_tokens=total_tokens,
-            intermediate_results=successful_results
-        )
+        total_tokens = 0
+        for t in tasks:
+            result = t.result()
+            if result is None:
+                continue
+            successful_results.append(result)
+            total_tokens += result["total_tokens"]
+            # Cached results were not processed by any leaf, so they do not count toward load
+            if result.get("cached"):
+                continue
+            if result["agent_name"] == "intermediate_left":
+                self.left_tokens += result["total_tokens"]
+            else:
+                self.right_tokens += result["total_tokens"]
+
+        return {
+            "task_id": task.task_id,
+            "total_tokens": total_tokens,
+            "intermediate_results": successful_results
+        }
 
     async def check_and_rebalance(self) -> dict:
         """Check load imbalance and rebalance if necessary."""
-        left_tokens = self.tokens_by_intermediate["intermediate_left"]
-        right_tokens = self.tokens_by_intermediate["intermediate_right"]
+        left_tokens = self.left_tokens
+        right_tokens = self.right_tokens
         total = left_tokens + right_tokens
 
         if total == 0:
             return {"rebalanced": False, "reason": "No tokens processed yet"}
 
-        left_ratio = left_tokens / total
-        right_ratio = right_tokens / total
-
-        imbalance = abs(left_ratio - right_ratio)
+        # |L/T - R/T| < threshold  <=>  |L - R| < threshold * T, with no division
+        diff = left_tokens - right_tokens
+        abs_diff = diff if diff >= 0 else -diff
 
-        if imbalance < self.load_balance_threshold:
+        if abs_diff < self.load_balance_threshold * total:
+            imbalance = abs_diff / total
             return {
                 "rebalanced": False,
                 "reason": f"Imbalance {imbalance:.2%} below threshold {self.load_balance_threshold:.0%}",
@@ -84,7 +124,7 @@ class RootAgent:
             }
 
         # Determine heavier and lighter intermediate
-        if left_tokens > right_tokens:
+        if diff > 0:
             heavier = "intermediate_left"
             lighter = "intermediate_right"
         else:
@@ -107,37 +147,54 @@ class RootAgent:
         leaf_to_move = heavier_children.pop()
         lighter_children.append(leaf_to_move)
 
-        # Update the intermediate agents
-        try:
-            await self._update_intermediate_children(heavier, heavier_children)
-            await self._update_intermediate_children(lighter, lighter_children)
-
-            # Reset token counters after rebalancing
-            self.tokens_by_intermediate["intermediate_left"] = 0
-            self.tokens_by_intermediate["intermediate_right"] = 0
-
-            return {
-                "rebalanced": True,
-                "moved_leaf": leaf_to_move,
-                "from": heavier,
-                "to": lighter,
-                "new_structure": {
-                    "intermediate_left": self.intermediate_children["intermediate_left"],
-                    "intermediate_right": self.intermediate_children["intermediate_right"]
-                }
-            }
-        except Exception as e:
-            # Rollback on failure
+        # Update both intermediate agents concurrently
+        results = await asyncio.gather(
+            self._update_intermediate_children(heavier, heavier_children),
+            self._update_intermediate_children(lighter, lighter_children),
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            # Rollback on failure, restoring any intermediate that accepted the update
             lighter_children.remove(leaf_to_move)
             heavier_children.append(leaf_to_move)
-            return {"rebalanced": False, "reason": f"Failed to update intermediates: {e}"}
+            await asyncio.gather(
+                *(
+                    self._update_intermediate_children(name, children)
+                    for name, children, result in zip(
+                        (heavier, lighter), (heavier_children, lighter_children), results
+                    )
+                    if not isinstance(result, Exception)
+                ),
+                return_exceptions=True
+            )
+            return {"rebalanced": False, "reason": f"Failed to update intermediates: {errors[0]}"}
+
+        # Reset token counters after rebalancing
+        self.left_tokens = 0
+        self.right_tokens = 0
+
+        return {
+            "rebalanced": True,
+            "moved_leaf": leaf_to_move,
+            "from": heavier,
+            "to": lighter,
+            "new_structure": {
+                "intermediate_left": self.intermediate_children["intermediate_left"],
+                "intermediate_right": self.intermediate_children["intermediate_right"]
+            }
+        }
 
     async def _update_intermediate_children(self, intermediate_name: str, new_children: list[str]):
         """Send update_children request to an intermediate agent."""
-        url = f"{get_agent_url(intermediate_name)}/update_children"
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(url, json={"new_children": new_children})
-            response.raise_for_status()
+        url = self.update_children_urls[intermediate_name]
+        response = await self.client.post(
+            url,
+            content=orjson.dumps({"new_children": new_children}),
+            headers=JSON_HEADERS,
+            timeout=10.0
+        )
+        response.raise_for_status()
 
     def get_health(self) -> HealthResponse:
         """Return health status."""
@@ -155,20 +212,40 @@ def create_app() -> FastAPI:
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        print(f"Root agent starting with children: {agent.children}")
+        logger.info("Root agent starting with children: %s", agent.children)
+        # Agent traffic is plain HTTP on the local host: skip proxy env lookup and CA loading
+        agent.client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                verify=False,
+                retries=0
+            ),
+            trust_env=False,
+            timeout=httpx.Timeout(60.0)
+        )
         yield
-        print("Root agent shutting down...")
+        await agent.client.aclose()
+        logger.info("Root agent shutting down...")
 
     app = FastAPI(
         title="Root Agent",
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
     )
 
-    @app.post("/task", response_model=RootResult)
+    # Intermediate results are trusted internal payloads, so skip response-model revalidation
+    @app.post("/task", response_model=None, responses={200: {"model": RootResult}})
     async def handle_task(task: Task):
-        """Receive a task, distribute to intermediates, and return aggregated results."""
+        """Receive a task, distribute to intermediates, and return aggregated results (RootResult shape)."""
+        # Serialize once; intermediates relay these bytes unchanged to the leaves
+        try:
+            task_bytes = orjson.dumps(task.model_dump(mode="json", exclude_none=True))
+        except TypeError as e:
+            # orjson only encodes integers that fit in 64 bits
+            raise HTTPException(status_code=422, detail=f"Task data cannot be encoded: {e}")
+
         try:
-            return await agent.process_task(task)
+            return await agent.process_task(task, task_bytes)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -207,6 +284,10 @@ def create_app() -> FastAPI:
 if __name__ == "__main__":
     import uvicorn
 
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    # httpx logs every request at INFO; keep it off the hot path
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
     port = PORTS["root"]
     app = create_app()
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, loop="uvloop", http="httptools")